@@ -1,12 +1,16 @@
 import base64
+import io
+import json
 import random
 from pathlib import Path
 from typing import List, Any
 import ddddocr
 import cv2
+import numpy as np
 import time
 import re
 import requests
+from PIL import Image
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
@@ -22,6 +26,10 @@ BASE64_PREFIX = "data:image/png;base64,"
 MIN_BOX_SIZE = 10
 ASPECT_RATIO_LIMIT = 8
 RANDOM_SLEEP_RANGE = (2, 5)
+MYOCR_MODEL_PATH = "models/bili_captcha_0.4074074074074074_250_7000_2025-05-29-00-42-07.onnx"
+CHARSETS_PATH = "models/charsets.json"
+MIN_PROMPT_SCORE = 0.05  # 提示字符得分阈值，低于该值视为未匹配
+USE_PROMPT_SCORING = True  # 主程序用得分矩阵分配点击序列；False 时使用文字精确匹配 + myocr 整图补充识别
 
 class ImageProcessor:
     """图像处理工具类"""
@@ -42,12 +50,14 @@ class ImageProcessor:
         return output_path
 
     @staticmethod
-    def process_image(image_path: Path, detector: ddddocr.DdddOcr, recognizer: ddddocr.DdddOcr, img_ele) -> List[
-        tuple[str, tuple]]:
-        img = cv2.imread(str(image_path))
-        if img is None:
-            raise ValueError(f"无法读取图像：{image_path}")
+    def detect_crops(img, detector: ddddocr.DdddOcr) -> List[tuple[tuple, Any]]:
+        """
+        检测图像上部区域中的文字框并裁剪。
 
+        :param img: 原图（cv2 图像）
+        :param detector: ddddocr 的 detector 实例
+        :return: [(bbox, cropped), ...]，按 x1 从左到右排序
+        """
         height, width = img.shape[:2]
         cropped_height = int(height * 0.85)
         img_top_85 = img[:cropped_height, :]
@@ -60,7 +70,7 @@ class ImageProcessor:
         bboxes = detect_and_merge(detector, cropped_image_bytes)
 
         bboxes.sort(key=lambda box: box[0])
-        results = []
+        crops = []
 
         for bbox in bboxes:
             x1, y1, x2, y2 = bbox
@@ -76,17 +86,55 @@ class ImageProcessor:
             cropped = img[y1:y2, x1:x2]
             if cropped.size == 0:
                 continue
+            crops.append(((x1, y1, x2, y2), cropped))
+        return crops
 
+    @staticmethod
+    def process_image(image_path: Path, detector: ddddocr.DdddOcr, recognizer: ddddocr.DdddOcr, img_ele) -> List[
+        tuple[str, tuple]]:
+        img = cv2.imread(str(image_path))
+        if img is None:
+            raise ValueError(f"无法读取图像：{image_path}")
+
+        results = []
+        for (x1, y1, x2, y2), cropped in ImageProcessor.detect_crops(img, detector):
             text = recognizer.classification(cv2.imencode('.png', cropped)[1].tobytes())
             if text.strip():
                 results.append((text, (x1, y1, x2, y2)))
                 ImageProcessor._draw_result(img, x1, y1, x2, y2, text)
 
+        ImageProcessor._save_result(img, image_path)
+        return results
+
+    @staticmethod
+    def score_image(image_path: Path, detector: ddddocr.DdddOcr, scorer: "PromptScorer", prompt: str):
+        """
+        对每个检测框只识别一次，保留输出概率，并计算对每个提示字符的得分。
+
+        :param scorer: configure_scorer 返回的打分器
+        :return: (scores, bboxes, crops)，scores 形状为 (len(bboxes), len(prompt))
+        """
+        img = cv2.imread(str(image_path))
+        if img is None:
+            raise ValueError(f"无法读取图像：{image_path}")
+
+        crops = ImageProcessor.detect_crops(img, detector)
+        bboxes = [bbox for bbox, _ in crops]
+        crop_bytes = [cv2.imencode('.png', cropped)[1].tobytes() for _, cropped in crops]
+        scores = score_prompt(scorer, crop_bytes, prompt)
+
+        for (x1, y1, x2, y2), row in zip(bboxes, scores):
+            if len(prompt) and row.max() > 0:
+                ImageProcessor._draw_result(img, x1, y1, x2, y2, prompt[int(row.argmax())])
+        ImageProcessor._save_result(img, image_path)
+        return scores, bboxes, crop_bytes
+
+    @staticmethod
+    def _save_result(img: cv2.Mat, image_path: Path) -> None:
         result_path = DEFAULT_OUTPUT_DIR / f"result_{image_path.name}"
         DEFAULT_OUTPUT_DIR.mkdir(exist_ok=True)
         cv2.imwrite(str(result_path), img)
         print(f"🎯 标注结果已保存至：{result_path}")
-        return results
 
     @staticmethod
     def _draw_result(img: cv2.Mat, x1: int, y1: int, x2: int, y2: int, text: str) -> None:
@@ -180,7 +228,10 @@ class WebCrawler:
         self.driver.refresh()
 
 
-def fill_click_sequence(results, prompt, v_channel_path, detector, myocr, img_ele):
+def fill_click_sequence(results, prompt, v_channel_path, detector, myocr, img_ele, random_fill: bool = True):
+    """
+    :param random_fill: 是否用剩余检测框随机填充未匹配的字符；关闭时未匹配项保留为 (char, None)
+    """
     click_sequence = []
     used_bboxes = set()
 
@@ -205,12 +256,172 @@ def fill_click_sequence(results, prompt, v_channel_path, detector, myocr, img_el
     print("🔁 补充后:", click_sequence)
 
     # 随机填充空白项（模拟点击一个合理但非目标的位置）
-    remaining_bboxes = [b for _, b in results if str(b) not in used_bboxes]
-    random.shuffle(remaining_bboxes)
+    if random_fill:
+        remaining_bboxes = [b for _, b in results if str(b) not in used_bboxes]
+        random.shuffle(remaining_bboxes)
 
-    for i, (char, bbox) in enumerate(click_sequence):
-        if bbox is None and remaining_bboxes:
-            click_sequence[i] = (char, remaining_bboxes.pop())
+        for i, (char, bbox) in enumerate(click_sequence):
+            if bbox is None and remaining_bboxes:
+                click_sequence[i] = (char, remaining_bboxes.pop())
+
+    print("✅ 最终点击序列:", click_sequence)
+    return click_sequence
+
+
+def load_charset(charsets_path: str = CHARSETS_PATH) -> List[str]:
+    """读取 charsets.json 中的字符表"""
+    with open(charsets_path, "r", encoding="utf-8") as f:
+        return json.load(f)["charset"]
+
+
+class PromptScorer:
+    """
+    对 ddddocr 官方识别模型的原始输出打分，绕过 classification(probability=True)。
+
+    ddddocr 1.5.6 的概率输出每次调用都会在 Python 里逐个查找字符下标并展开整张 softmax，
+    比普通识别慢数倍；这里直接取模型 logits，在 numpy 中完成 softmax 和按列取值。
+    """
+
+    def __init__(self, session, model_charset: List[str], charset: List[str]):
+        """
+        :param session: 官方识别模型的 InferenceSession
+        :param model_charset: 模型输出列对应的字符表
+        :param charset: 允许打分的字符（charsets.json），其余提示字符记 0 分
+        """
+        self.session = session
+        allowed = set(charset)
+        # charsets.json 字符 -> 模型输出列，只在初始化时构建一次
+        self.columns = {}
+        for i, char in enumerate(model_charset):
+            if char in allowed and char not in self.columns:
+                self.columns[char] = i
+
+    def prompt_index(self, prompt: str) -> np.ndarray:
+        """提示字符对应的模型输出列，未知字符为 -1"""
+        return np.array([self.columns.get(char, -1) for char in prompt], dtype=np.int64)
+
+    def logits(self, img_bytes: bytes) -> np.ndarray:
+        """
+        与 ddddocr 官方模型相同的预处理后推理一次。
+
+        :return: 形状为 (时间步, 字符数) 的 logits
+        """
+        image = Image.open(io.BytesIO(img_bytes))
+        width = max(1, int(image.size[0] * (64 / image.size[1])))
+        image = image.resize((width, 64), Image.LANCZOS).convert('L')
+        data = (np.array(image, dtype=np.float32)[None, None] / 255. - 0.5) / 0.5
+        output = self.session.run(None, {'input1': data})[0]
+        return output.reshape(-1, output.shape[-1])
+
+
+def configure_scorer(recognizer: ddddocr.DdddOcr, charsets_path: str = CHARSETS_PATH) -> PromptScorer:
+    """
+    复用 recognizer 已加载的官方模型构建 PromptScorer，不额外加载模型。
+
+    依赖 ddddocr 1.5.6 的私有属性 _DdddOcr__ort_session / _DdddOcr__charset；
+    需在 SolveProfiler.attach_ocr 之后调用，才能用上开启 profiling 的会话。
+    """
+    if recognizer.use_import_onnx or recognizer.det:
+        raise ValueError("打分只支持 ddddocr 官方识别模型")
+    session = getattr(recognizer, "_DdddOcr__ort_session", None)
+    model_charset = getattr(recognizer, "_DdddOcr__charset", None)
+    if session is None or model_charset is None:
+        raise RuntimeError("recognizer 上未找到识别会话或字符表，ddddocr 版本可能不兼容")
+    return PromptScorer(session, model_charset, load_charset(charsets_path))
+
+
+def score_logits(logits: List[np.ndarray], index: np.ndarray) -> np.ndarray:
+    """
+    把所有裁剪图的 logits 拼接后一次性完成 softmax、按列取值和按裁剪图取最大值。
+
+    :param logits: 每个裁剪图 (时间步, 字符数) 的 logits
+    :param index: 提示字符对应的列，-1 表示不在字符表中（记 0 分）
+    :return: 形状为 (len(logits), len(index)) 的得分矩阵
+    """
+    scores = np.zeros((len(logits), len(index)), dtype=np.float32)
+    lengths = np.array([len(item) for item in logits], dtype=np.int64)
+    rows = lengths > 0  # 没有时间步的裁剪图记 0 分
+    known = index >= 0
+    if not rows.any() or not known.any():
+        return scores
+
+    flat = np.concatenate([item for item in logits if len(item)]).astype(np.float32)
+    flat -= flat.max(axis=1, keepdims=True)
+    log_norm = np.log(np.exp(flat).sum(axis=1, keepdims=True))
+    probabilities = np.exp(flat[:, index[known]] - log_norm)
+
+    offsets = np.concatenate([[0], np.cumsum(lengths[rows])[:-1]])
+    scores[np.ix_(rows, known)] = np.maximum.reduceat(probabilities, offsets, axis=0)
+    return scores
+
+
+def score_prompt(scorer: PromptScorer, crop_bytes: List[bytes], prompt: str) -> np.ndarray:
+    """
+    每个裁剪图只推理一次，计算其对每个提示字符的得分。
+
+    得分为该字符在所有时间步上的最大 softmax 概率。
+
+    :param scorer: configure_scorer 返回的打分器
+    :param crop_bytes: 裁剪图的 PNG 字节列表
+    :param prompt: 提示文字
+    :return: 形状为 (len(crop_bytes), len(prompt)) 的得分矩阵
+    """
+    if not crop_bytes or not prompt:
+        return np.zeros((len(crop_bytes), len(prompt)), dtype=np.float32)
+    return score_logits([scorer.logits(img) for img in crop_bytes], scorer.prompt_index(prompt))
+
+
+def fill_click_sequence_scored(scores: np.ndarray, bboxes, crop_bytes, prompt, myocr=None,
+                               min_score: float = MIN_PROMPT_SCORE, random_fill: bool = True):
+    """
+    根据得分矩阵分配点击序列，替代 fill_click_sequence 中的文字精确匹配。
+
+    按得分从高到低贪心分配，每个检测框最多分配给一个提示字符。
+    仍未匹配的字符只对剩余检测框用 myocr 补充识别，不再重跑整张图。
+
+    :param scores: score_prompt 返回的得分矩阵
+    :param bboxes: 与 scores 行对应的检测框
+    :param crop_bytes: 与 scores 行对应的裁剪图 PNG 字节
+    :param prompt: 提示文字
+    :param myocr: 可选的自定义识别模型
+    :param min_score: 得分阈值
+    :param random_fill: 是否用剩余检测框随机填充未匹配的字符；关闭时未匹配项保留为 (char, None)
+    :return: [(char, bbox), ...]
+    """
+    click_sequence = [(char, None) for char in prompt]
+    used_rows = set()
+
+    order = np.argsort(scores, axis=None)[::-1]
+    for row, col in zip(*np.unravel_index(order, scores.shape)):
+        if scores[row, col] < min_score:
+            break
+        if row in used_rows or click_sequence[col][1] is not None:
+            continue
+        click_sequence[col] = (prompt[col], bboxes[row])
+        used_rows.add(row)
+
+    print("📌 得分匹配:", click_sequence)
+
+    if myocr is not None and any(b is None for _, b in click_sequence):
+        for row in range(len(bboxes)):
+            if row in used_rows:
+                continue
+            text = myocr.classification(crop_bytes[row])
+            col = next((i for i, (char, bbox) in enumerate(click_sequence) if bbox is None and char == text), None)
+            if col is not None:
+                click_sequence[col] = (prompt[col], bboxes[row])
+                used_rows.add(row)
+
+        print("🔁 补充后:", click_sequence)
+
+    # 随机填充空白项（模拟点击一个合理但非目标的位置）
+    if random_fill:
+        remaining_bboxes = [b for row, b in enumerate(bboxes) if row not in used_rows]
+        random.shuffle(remaining_bboxes)
+
+        for i, (char, bbox) in enumerate(click_sequence):
+            if bbox is None and remaining_bboxes:
+                click_sequence[i] = (char, remaining_bboxes.pop())
 
     print("✅ 最终点击序列:", click_sequence)
     return click_sequence
@@ -349,11 +560,12 @@ def detect_and_merge(detector, img_bytes) -> List[tuple[int, int, int, int]]:
 
 
 
-def recognize_bottom_text(img_path):
+def recognize_bottom_text(img_path, ocr=None):
     """
     裁剪图像底部区域并进行 OCR 识别。
 
     :param img_path: 图像路径
+    :param ocr: 复用的 ddddocr 识别实例，不传则临时创建
     :return: 识别结果文本
     """
     image = cv2.imread(img_path)
@@ -363,7 +575,8 @@ def recognize_bottom_text(img_path):
     _, buffer = cv2.imencode(".jpg", crop_img)
     img_bytes = buffer.tobytes()
 
-    ocr = ddddocr.DdddOcr()
+    if ocr is None:
+        ocr = ddddocr.DdddOcr()
     result = ocr.classification(img_bytes)
     print("底部区域识别结果：", result)
     return result
@@ -380,8 +593,9 @@ if __name__ == "__main__":
     detector = ddddocr.DdddOcr(det=True)
     recognizer = ddddocr.DdddOcr()
     myocr = ddddocr.DdddOcr(det=True,
-                            import_onnx_path="models/bili_captcha_0.4074074074074074_250_7000_2025-05-29-00-42-07.onnx",
-                            charsets_path="models/charsets.json")
+                            import_onnx_path=MYOCR_MODEL_PATH,
+                            charsets_path=CHARSETS_PATH)
+    scorer = configure_scorer(recognizer)
 
     with WebCrawler() as crawler:
 
@@ -393,14 +607,18 @@ if __name__ == "__main__":
                 bilibili.open()
                 img_path, img_ele = bilibili.get_pic(i)
 
-                prompt = recognize_bottom_text(img_path)
+                prompt = recognize_bottom_text(img_path, recognizer)
 
-                # 第一步：提取明度图并识别字符
+                # 第一步：提取明度图
                 v_channel_path = ImageProcessor.save_v_channel(img_path)
-                results = ImageProcessor.process_image(v_channel_path, detector, recognizer, img_ele)
 
-                # 第二步：根据 prompt 构造点击序列
-                click_sequence = fill_click_sequence(results, prompt)
+                # 第二步：识别字符并根据 prompt 构造点击序列
+                if USE_PROMPT_SCORING:
+                    scores, bboxes, crops = ImageProcessor.score_image(v_channel_path, detector, scorer, prompt)
+                    click_sequence = fill_click_sequence_scored(scores, bboxes, crops, prompt, myocr)
+                else:
+                    results = ImageProcessor.process_image(v_channel_path, detector, recognizer, img_ele)
+                    click_sequence = fill_click_sequence(results, prompt, v_channel_path, detector, myocr, img_ele)
 
                 # 第三步：模拟点击
                 crawler._simulate_clicks(img_ele, img_path, click_sequence)
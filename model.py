@@ -5,10 +5,17 @@ import time
 
 
 class Model:
-    def __init__(self):
+    def __init__(self, profiler=None):
+        """
+        :param profiler: 可选的 SolveProfiler，传入时会话由它创建以开启逐算子 profiling
+        """
         self.img = None
-        self.yolo = onnxruntime.InferenceSession("yolov8s.onnx")
-        self.Siamese = onnxruntime.InferenceSession("siamese.onnx")
+        if profiler is None:
+            self.yolo = onnxruntime.InferenceSession("yolov8s.onnx")
+            self.Siamese = onnxruntime.InferenceSession("siamese.onnx")
+        else:
+            self.yolo = profiler.session("yolov8s.onnx", "yolo")
+            self.Siamese = profiler.session("siamese.onnx", "siamese")
         self.classes = ["big", "small"]
         self.color_palette = np.random.uniform(0, 255, size=(len(self.classes), 3))
 
@@ -0,0 +1,233 @@
+import cProfile
+import json
+import pstats
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+import onnxruntime
+
+DEFAULT_PROFILE_DIR = Path("profile")
+TOP_N = 15  # 汇总中展示的算子 / 函数数量
+MAX_PYTHON_EVENTS = 2000  # 写入 trace 的调用树节点上限，避免文件过大
+MIN_FLAME_US = 50  # 调用树中短于该时长（微秒）的节点不展开
+
+
+class SolveProfiler:
+    """
+    离线求解的性能分析器。
+
+    开启后：
+    - 通过 session() / attach_ocr() 创建的 onnxruntime 会话会打开逐算子 profiling；
+    - batch() 期间用 cProfile 统计 Python 代码；
+    - finish() 时结束会话 profiling，按批次的时间窗口切分算子事件，与该批次的 cProfile 调用树合并为一个
+      Chrome trace 文件（chrome://tracing / Perfetto 可直接打开），并打印按自耗时排序的算子与函数汇总。
+
+    会话在整个运行期间只创建一次，批次之间不会重新冷启动。
+    未开启时所有方法都退化为普通行为，调用方无需区分；stage() 的耗时始终记录在 stage_durations 中。
+    """
+
+    def __init__(self, output_dir: Path = DEFAULT_PROFILE_DIR, enabled: bool = True):
+        self.output_dir = Path(output_dir)
+        self.enabled = enabled
+        self._sessions = []  # [(label, session, anchor_ns), ...]
+        self._spans = []  # [(name, start_ns, end_ns), ...]
+        self._batches = []  # [(name, start_ns, end_ns, pstats.Stats), ...]
+        self.stage_durations = defaultdict(list)  # {阶段名: [耗时秒, ...]}
+
+    def session(self, path_or_bytes, label: str, providers=None) -> onnxruntime.InferenceSession:
+        """
+        创建 InferenceSession，开启时附带逐算子 profiling。
+
+        :param path_or_bytes: 模型路径或模型字节
+        :param label: 会话名称，用于 trace 中区分轨道
+        :param providers: 执行后端，默认由 onnxruntime 决定
+        """
+        if not self.enabled:
+            return onnxruntime.InferenceSession(path_or_bytes, providers=providers)
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        options = onnxruntime.SessionOptions()
+        options.enable_profiling = True
+        options.profile_file_prefix = str(self.output_dir / f"ort_{label}")
+        # onnxruntime 的事件时间戳相对于会话创建时刻，记录创建前的时刻用于对齐到 Python 时间轴
+        anchor_ns = time.perf_counter_ns()
+        session = onnxruntime.InferenceSession(path_or_bytes, options, providers=providers)
+        self._sessions.append((label, session, anchor_ns))
+        return session
+
+    def attach_ocr(self, ocr, label: str):
+        """
+        把 ddddocr 实例内部的 InferenceSession 替换为开启 profiling 的会话。
+
+        ddddocr 不暴露 SessionOptions，这里按属性类型查找会话（ddddocr 中为 _DdddOcr__ort_session），
+        并用 onnxruntime 私有属性 _model_path / _model_bytes 以相同模型和后端重建。
+        在 ddddocr 1.5.6、onnxruntime 1.19 上验证；库结构变化导致找不到会话时抛出 RuntimeError。
+        """
+        if not self.enabled:
+            return ocr
+        attached = False
+        for attr, value in list(vars(ocr).items()):
+            if not isinstance(value, onnxruntime.InferenceSession):
+                continue
+            source = getattr(value, "_model_path", None) or getattr(value, "_model_bytes", None)
+            if source is None:
+                raise RuntimeError(f"无法获取 {label} 会话的模型来源，onnxruntime 版本可能不兼容")
+            setattr(ocr, attr, self.session(source, label, providers=value.get_providers()))
+            attached = True
+        if not attached:
+            raise RuntimeError(f"{label} 实例上未找到 InferenceSession，ddddocr 版本可能不兼容")
+        return ocr
+
+    @contextmanager
+    def stage(self, name: str):
+        """记录一个 Python 阶段的耗时，开启时在 trace 中显示为一段时间块"""
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            end = time.perf_counter_ns()
+            self.stage_durations[name].append((end - start) / 1e9)
+            if self.enabled:
+                self._spans.append((name, start, end))
+
+    @contextmanager
+    def batch(self, name: str):
+        """一个图像批次的分析区间，trace 在 finish() 时写出为 <output_dir>/<name>.trace.json"""
+        if not self.enabled:
+            yield
+            return
+
+        profile = cProfile.Profile()
+        start_ns = time.perf_counter_ns()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            end_ns = time.perf_counter_ns()
+            self._spans.append((name, start_ns, end_ns))
+            self._batches.append((name, start_ns, end_ns, pstats.Stats(profile)))
+
+    def finish(self) -> list[Path]:
+        """结束所有会话的 profiling，按批次写出 trace 并打印汇总"""
+        if not self.enabled:
+            return []
+
+        ort_events = []  # [(label, 绝对时间 ns, event), ...]
+        for label, session, anchor_ns in self._sessions:
+            trace_path = Path(session.end_profiling())
+            with open(trace_path, "r", encoding="utf-8") as f:
+                events = json.load(f)
+            trace_path.unlink()
+            for event in events:
+                if event.get("ph") == "X":
+                    ort_events.append((label, anchor_ns + int(event["ts"] * 1000), event))
+        self._sessions = []
+
+        paths = []
+        for name, start_ns, end_ns, stats in self._batches:
+            batch_events = [(label, ts_ns, event) for label, ts_ns, event in ort_events if start_ns <= ts_ns < end_ns]
+            spans = [span for span in self._spans if start_ns <= span[1] < end_ns]
+            paths.append(self._dump(name, start_ns, stats, spans, batch_events))
+        self._batches = []
+        self._spans = []
+        return paths
+
+    def _dump(self, name: str, start_ns: int, stats: pstats.Stats, spans, ort_events) -> Path:
+        events = [
+            {"ph": "M", "pid": "python", "name": "process_name", "args": {"name": "python"}},
+            {"ph": "M", "pid": "cProfile", "name": "process_name", "args": {"name": "cProfile 调用树（非时间线）"}},
+        ]
+        for span_name, begin, end in spans:
+            events.append({
+                "name": span_name, "cat": "stage", "ph": "X", "pid": "python", "tid": "stages",
+                "ts": (begin - start_ns) / 1000, "dur": (end - begin) / 1000,
+            })
+
+        op_self_time = defaultdict(float)
+        labels = set()
+        for label, ts_ns, event in ort_events:
+            pid = f"onnx:{label}"
+            if label not in labels:
+                labels.add(label)
+                events.append({"ph": "M", "pid": pid, "name": "process_name", "args": {"name": pid}})
+            events.append(dict(event, pid=pid, ts=(ts_ns - start_ns) / 1000))
+            # 算子自耗时取 kernel 执行时间，fence 等辅助事件不计入
+            if event.get("cat") == "Node" and event["name"].endswith("_kernel_time"):
+                op_type = event.get("args", {}).get("op_name", event["name"])
+                op_self_time[f"{label}:{op_type}"] += event["dur"]
+
+        events.extend(call_tree_events(stats))
+
+        functions = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)
+        top_ops = sorted(op_self_time.items(), key=lambda item: item[1], reverse=True)[:TOP_N]
+        top_functions = [(function_label(func), tottime) for func, (_, _, tottime, _, _) in functions[:TOP_N]]
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        output_path = self.output_dir / f"{name}.trace.json"
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "traceEvents": events,
+                "displayTimeUnit": "ms",
+                "otherData": {
+                    "top_operators_ms": {op: dur / 1000 for op, dur in top_ops},
+                    "top_functions_ms": {func: tottime * 1000 for func, tottime in top_functions},
+                },
+            }, f, ensure_ascii=False)
+
+        print(f"\n📊 批次 {name} 性能分析已保存至：{output_path}")
+        print("  算子自耗时 Top:")
+        for op, dur in top_ops:
+            print(f"    {dur / 1000:10.3f} ms  {op}")
+        print("  Python 函数自耗时 Top:")
+        for func, tottime in top_functions:
+            print(f"    {tottime * 1000:10.3f} ms  {func}")
+        return output_path
+
+
+def function_label(func) -> str:
+    filename, line, name = func
+    return f"{name} ({Path(filename).name}:{line})"
+
+
+def call_tree_events(stats: pstats.Stats) -> list[dict]:
+    """
+    根据 pstats 的调用关系还原嵌套调用栈，生成火焰图形式的 trace 事件（放在单独的 cProfile 进程下）。
+
+    cProfile 只有按调用边聚合的耗时，没有时间线：横轴为累计耗时而非真实时刻。
+    一个函数被多处调用时，按当前节点占该函数总累计耗时的比例分摊其子调用。
+    """
+    callees = defaultdict(list)
+    for func, (_, _, _, _, callers) in stats.stats.items():
+        for caller, (_, _, _, edge_cumtime) in callers.items():
+            callees[caller].append((func, edge_cumtime))
+    roots = sorted((func for func, (*_, callers) in stats.stats.items() if not callers),
+                   key=lambda func: stats.stats[func][3], reverse=True)
+
+    events = []
+
+    def walk(func, ts, dur, path):
+        if dur < MIN_FLAME_US or len(events) >= MAX_PYTHON_EVENTS:
+            return
+        _, ncalls, tottime, cumtime, _ = stats.stats[func]
+        events.append({
+            "name": function_label(func), "cat": "cProfile", "ph": "X", "pid": "cProfile", "tid": "call tree",
+            "ts": ts, "dur": dur, "args": {"ncalls": ncalls, "tottime_s": tottime, "cumtime_s": cumtime},
+        })
+        scale = dur / (cumtime * 1e6) if cumtime else 0
+        child_ts, end = ts, ts + dur
+        for callee, edge_cumtime in sorted(callees[func], key=lambda item: item[1], reverse=True):
+            if callee in path:
+                continue  # 递归调用不再展开
+            child_dur = min(edge_cumtime * 1e6 * scale, end - child_ts)
+            walk(callee, child_ts, child_dur, path | {callee})
+            child_ts += child_dur
+
+    ts = 0.0
+    for root in roots:
+        dur = stats.stats[root][3] * 1e6
+        walk(root, ts, dur, {root})
+        ts += dur
+    return events
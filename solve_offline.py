@@ -0,0 +1,140 @@
+import argparse
+from pathlib import Path
+
+import ddddocr
+
+from bili_dddd import (ImageProcessor, fill_click_sequence, fill_click_sequence_scored, configure_scorer,
+                       recognize_bottom_text, MYOCR_MODEL_PATH, CHARSETS_PATH)
+from model import Model
+from profiler import SolveProfiler, DEFAULT_PROFILE_DIR
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png"}
+PIPELINES = ("model", "dddd", "dddd_score")
+
+
+def collect_images(paths) -> list[Path]:
+    """展开命令行传入的图片路径和目录"""
+    images = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            images.extend(sorted(p for p in path.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES))
+        else:
+            images.append(path)
+    return images
+
+
+class ModelPipeline:
+    """main.py 的识别流程：YOLO 检测 + Siamese 顺序匹配"""
+
+    name = "model"
+
+    def __init__(self, profiler: SolveProfiler):
+        self.profiler = profiler
+        self.model = Model(profiler=profiler if profiler.enabled else None)
+
+    def solve(self, image_path: Path):
+        img_content = image_path.read_bytes()
+        with self.profiler.stage("model.detect"):
+            small_img, big_img = self.model.detect(img_content)
+        with self.profiler.stage("model.split_order_image"):
+            order_imgs = self.model.split_order_image(count=len(small_img.keys()))
+        with self.profiler.stage("model.siamese_from_order"):
+            return self.model.siamese_from_order(order_imgs, big_img)
+
+
+class DdddPipeline:
+    """bili_dddd.py 的识别流程：明度通道 + ddddocr 检测识别 + 点击序列匹配"""
+
+    name = "dddd"
+
+    def __init__(self, profiler: SolveProfiler, random_fill: bool = True):
+        """
+        :param random_fill: 是否用剩余检测框随机填充未匹配的字符，黄金集门禁中关闭以免随机命中被算作正确
+        """
+        self.profiler = profiler
+        self.random_fill = random_fill
+        # 会话和阶段名带上流程名，--pipeline all 时两个 ddddocr 流程的算子耗时在 trace 和汇总中分开统计
+        self.detector = profiler.attach_ocr(ddddocr.DdddOcr(det=True, show_ad=False), f"{self.name}_det")
+        self.recognizer = profiler.attach_ocr(ddddocr.DdddOcr(show_ad=False), f"{self.name}_ocr")
+        self.myocr = profiler.attach_ocr(
+            ddddocr.DdddOcr(import_onnx_path=MYOCR_MODEL_PATH, charsets_path=CHARSETS_PATH, show_ad=False),
+            f"{self.name}_myocr")
+
+    def solve(self, image_path: Path):
+        with self.profiler.stage(f"{self.name}.recognize_bottom_text"):
+            prompt = recognize_bottom_text(str(image_path), self.recognizer)
+        with self.profiler.stage(f"{self.name}.save_v_channel"):
+            v_channel_path = ImageProcessor.save_v_channel(image_path)
+        with self.profiler.stage(f"{self.name}.process_image"):
+            results = ImageProcessor.process_image(v_channel_path, self.detector, self.recognizer, None)
+        with self.profiler.stage(f"{self.name}.fill_click_sequence"):
+            return fill_click_sequence(results, prompt, v_channel_path, self.detector, self.myocr, None,
+                                       random_fill=self.random_fill)
+
+
+class DdddScorePipeline(DdddPipeline):
+    """DdddPipeline 的打分模式：每个检测框只识别一次，按提示字符得分矩阵分配点击序列"""
+
+    name = "dddd_score"
+
+    def __init__(self, profiler: SolveProfiler, random_fill: bool = True):
+        super().__init__(profiler, random_fill)
+        # 复用 recognizer 已加载（且已开启 profiling）的官方模型会话，不再额外加载一份
+        self.scorer = configure_scorer(self.recognizer)
+
+    def solve(self, image_path: Path):
+        with self.profiler.stage(f"{self.name}.recognize_bottom_text"):
+            prompt = recognize_bottom_text(str(image_path), self.recognizer)
+        with self.profiler.stage(f"{self.name}.save_v_channel"):
+            v_channel_path = ImageProcessor.save_v_channel(image_path)
+        with self.profiler.stage(f"{self.name}.score_image"):
+            scores, bboxes, crops = ImageProcessor.score_image(v_channel_path, self.detector, self.scorer, prompt)
+        with self.profiler.stage(f"{self.name}.fill_click_sequence_scored"):
+            return fill_click_sequence_scored(scores, bboxes, crops, prompt, self.myocr,
+                                              random_fill=self.random_fill)
+
+
+PIPELINE_CLASSES = {"model": ModelPipeline, "dddd": DdddPipeline, "dddd_score": DdddScorePipeline}
+
+
+def build_pipelines(names, profiler: SolveProfiler) -> dict:
+    return {name: PIPELINE_CLASSES[name](profiler) for name in names}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="离线识别本地验证码图片")
+    parser.add_argument("images", nargs="+", help="验证码图片或所在目录")
+    parser.add_argument("--pipeline", choices=PIPELINES + ("all",), default="all", help="使用的识别流程")
+    parser.add_argument("--batch-size", type=int, default=8, help="每个批次的图片数量")
+    parser.add_argument("--profile", action="store_true",
+                        help="开启 onnxruntime 逐算子 profiling 和 cProfile，每个批次输出一个 Chrome trace")
+    parser.add_argument("--profile-dir", type=Path, default=DEFAULT_PROFILE_DIR, help="profiling 结果输出目录")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    images = collect_images(args.images)
+    names = PIPELINES if args.pipeline == "all" else (args.pipeline,)
+    profiler = SolveProfiler(args.profile_dir, enabled=args.profile)
+
+    pipelines = build_pipelines(names, profiler)
+    if profiler.enabled and images:
+        # 预热一次，首次推理的内存分配和 kernel 选择不计入任何批次
+        for pipeline in pipelines.values():
+            pipeline.solve(images[0])
+
+    try:
+        for start in range(0, len(images), args.batch_size):
+            batch = images[start:start + args.batch_size]
+            with profiler.batch(f"batch_{start // args.batch_size:03d}"):
+                for image_path in batch:
+                    for name, pipeline in pipelines.items():
+                        result = pipeline.solve(image_path)
+                        print(f"[{name}] {image_path.name}: {result}")
+    finally:
+        profiler.finish()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+from bili_dddd import (PromptScorer, configure_scorer, score_logits, score_prompt, fill_click_sequence_scored,
+                       load_charset)
+
+CHARSETS_PATH = Path(__file__).parent / "models" / "charsets.json"
+MODEL_CHARSET = ["", "红", "烧", "茄", "子"]
+
+
+def logits(probabilities):
+    """以对数概率作为 logits，softmax 后恰好还原为给定概率"""
+    return np.log(np.asarray(probabilities, dtype=np.float32) + 1e-12)
+
+
+def png(height, width):
+    return cv2.imencode(".png", np.full((height, width, 3), 255, np.uint8))[1].tobytes()
+
+
+class FakeSession:
+    """按顺序返回预设 logits 的 InferenceSession 替身，输出形状与 ddddocr 官方模型一致 (时间步, 1, 字符数)"""
+
+    def __init__(self, outputs):
+        self.outputs = list(outputs)
+        self.inputs = []
+
+    def run(self, output_names, feed):
+        self.inputs.append(feed["input1"])
+        return [self.outputs.pop(0)[:, None, :]]
+
+
+class FakeOcr:
+    """按顺序返回预设文字的 myocr 替身，记录被识别的裁剪图"""
+
+    def __init__(self, texts):
+        self.texts = list(texts)
+        self.calls = []
+
+    def classification(self, img):
+        self.calls.append(img)
+        return self.texts.pop(0)
+
+
+def test_score_logits_takes_max_over_steps():
+    scores = score_logits([
+        logits([[0.9, 0.1, 0.0, 0.0, 0.0], [0.1, 0.0, 0.8, 0.1, 0.0]]),
+        logits([[0.2, 0.7, 0.1, 0.0, 0.0]]),
+    ], np.array([2, 1]))
+    np.testing.assert_allclose(scores, [[0.8, 0.1], [0.1, 0.7]], rtol=1e-5)
+
+
+def test_score_logits_single_step_different_lengths_and_empty_crop():
+    scores = score_logits([
+        logits([[0.1, 0.0, 0.0, 0.9, 0.0]]),
+        np.zeros((0, 5), dtype=np.float32),
+        logits([[0.5, 0.0, 0.0, 0.0, 0.5], [0.5, 0.0, 0.0, 0.0, 0.5], [0.0, 0.0, 0.0, 0.3, 0.7]]),
+    ], np.array([3, 4]))
+    np.testing.assert_allclose(scores, [[0.9, 0.0], [0.0, 0.0], [0.3, 0.7]], rtol=1e-5, atol=1e-6)
+
+
+def test_score_logits_unknown_columns_score_zero():
+    scores = score_logits([logits([[0.2, 0.6, 0.2, 0.0, 0.0]])], np.array([-1, 1, -1]))
+    np.testing.assert_allclose(scores, [[0.0, 0.6, 0.0]], rtol=1e-5)
+    assert score_logits([logits([[1.0, 0, 0, 0, 0]])], np.array([-1])).tolist() == [[0.0]]
+
+
+def test_prompt_index_limits_to_charset_and_model():
+    # “子”不在允许的字符表中，“鱼”不在模型字符表中；模型字符表重复时取第一列
+    scorer = PromptScorer(FakeSession([]), MODEL_CHARSET + ["红"], ["红", "烧", "茄", "鱼"])
+    assert scorer.prompt_index("红子鱼茄").tolist() == [1, -1, -1, 3]
+
+
+def test_score_prompt_runs_once_per_crop():
+    session = FakeSession([
+        logits([[0.1, 0.0, 0.8, 0.1, 0.0]]),
+        logits([[0.2, 0.7, 0.1, 0.0, 0.0], [0.9, 0.1, 0.0, 0.0, 0.0]]),
+    ])
+    scorer = PromptScorer(session, MODEL_CHARSET, MODEL_CHARSET)
+    scores = score_prompt(scorer, [png(32, 32), png(32, 64)], "烧红")
+    np.testing.assert_allclose(scores, [[0.8, 0.0], [0.1, 0.7]], rtol=1e-5, atol=1e-6)
+    # 与 ddddocr 官方模型相同的输入：高度缩放到 64，单通道
+    assert [x.shape for x in session.inputs] == [(1, 1, 64, 64), (1, 1, 64, 128)]
+
+
+def test_score_prompt_empty_inputs():
+    scorer = PromptScorer(FakeSession([]), MODEL_CHARSET, MODEL_CHARSET)
+    assert score_prompt(scorer, [], "红烧").shape == (0, 2)
+    assert score_prompt(scorer, [png(32, 32)], "").shape == (1, 0)
+
+
+def test_score_prompt_real_model_narrow_crop():
+    # 10x80 的框能通过 detect_crops 的过滤（宽 = MIN_BOX_SIZE，宽高比 = ASPECT_RATIO_LIMIT），
+    # 只有一个时间步；ddddocr 的 probability=True 路径在这里会抛 TypeError
+    ddddocr = pytest.importorskip("ddddocr")
+    scorer = configure_scorer(ddddocr.DdddOcr(show_ad=False), CHARSETS_PATH)
+    prompt = "".join(load_charset(CHARSETS_PATH)[1:4])
+    scores = score_prompt(scorer, [png(80, 10), png(40, 40)], prompt)
+    assert scores.shape == (2, 3)
+    assert np.all((scores >= 0) & (scores <= 1))
+
+
+def test_configure_scorer_rejects_imported_models():
+    ddddocr = pytest.importorskip("ddddocr")
+    with pytest.raises(ValueError):
+        configure_scorer(ddddocr.DdddOcr(det=True, show_ad=False), CHARSETS_PATH)
+
+
+def test_fill_scored_greedy_assignment():
+    scores = np.array([
+        [0.9, 0.8],
+        [0.7, 0.1],
+    ])
+    sequence = fill_click_sequence_scored(scores, ["A", "B"], [b"a", b"b"], "红烧")
+    # A 对“红”得分最高，先分配；A 已被占用，“烧”只能取剩下的 B
+    assert sequence == [("红", "A"), ("烧", "B")]
+
+
+def test_fill_scored_repeated_prompt_characters():
+    scores = np.array([
+        [0.9, 0.9],
+        [0.6, 0.6],
+    ])
+    sequence = fill_click_sequence_scored(scores, ["A", "B"], [b"a", b"b"], "红红")
+    assert sorted(bbox for _, bbox in sequence) == ["A", "B"]
+
+
+def test_fill_scored_min_score_and_myocr_fallback():
+    scores = np.array([
+        [0.9, 0.0, 0.0],
+        [0.01, 0.02, 0.0],
+        [0.0, 0.01, 0.03],
+    ])
+    myocr = FakeOcr(["烧", "茄"])
+    sequence = fill_click_sequence_scored(scores, ["A", "B", "C"], [b"a", b"b", b"c"], "红烧茄", myocr,
+                                          min_score=0.05)
+    assert sequence == [("红", "A"), ("烧", "B"), ("茄", "C")]
+    # 只对未分配的裁剪图补充识别
+    assert myocr.calls == [b"b", b"c"]
+
+
+def test_fill_scored_without_myocr_falls_back_to_leftover_boxes():
+    scores = np.array([
+        [0.9, 0.0],
+        [0.0, 0.0],
+    ])
+    sequence = fill_click_sequence_scored(scores, ["A", "B"], [b"a", b"b"], "红烧")
+    assert sequence == [("红", "A"), ("烧", "B")]
+
+
+@pytest.mark.parametrize("prompt", ["红", "红烧茄"])
+def test_fill_scored_keeps_prompt_order_and_length(prompt):
+    scores = np.zeros((2, len(prompt)))
+    sequence = fill_click_sequence_scored(scores, ["A", "B"], [b"a", b"b"], prompt)
+    assert [char for char, _ in sequence] == list(prompt)
+
+
+def test_fill_scored_without_random_fill_keeps_misses():
+    scores = np.array([
+        [0.9, 0.0],
+        [0.0, 0.0],
+    ])
+    sequence = fill_click_sequence_scored(scores, ["A", "B"], [b"a", b"b"], "红烧", random_fill=False)
+    assert sequence == [("红", "A"), ("烧", None)]
+
@@ -0,0 +1,312 @@
+"""
+黄金集回归门禁：离线跑 Model 和 bili_dddd.py 的识别流程，同时检查逐图点击正确性和 p95 延迟。
+
+用例格式（golden/cases/<name>.json，图片放在同一目录）::
+
+    {
+        "image": "bili_captcha_1.jpg",
+        "prompt": "红烧茄子",
+        "clicks": [[120, 80], [45, 150], [200, 60], [160, 120]],
+        "tolerance": 20
+    }
+
+- clicks 为按提示顺序的点击点（原图像素坐标），tolerance 为允许的像素距离，缺省为 DEFAULT_TOLERANCE；
+- golden/expected.json 按流程记录每个用例是否应当通过（{"dddd": {"case_1": true, ...}}），
+  应当通过的用例失败即判定为回归；
+- golden/budgets.json 记录每个流程的整图 p95 和分阶段 p95 预算（毫秒）；
+- 有用例时，流程在 expected.json 或 budgets.json 中缺少条目、或有用例未列入 expected.json 均判定为失败；
+- 未匹配的提示字符不做随机填充，记为未点击，避免随机命中被算作正确；
+- 流程在临时目录中运行，标注图、明度图等中间文件不会写入仓库。
+
+添加或更新用例后，用 GOLDEN_UPDATE=1 python -m pytest -q test_golden.py 按当前结果重新标定
+expected.json 和 budgets.json（预算取实测 p95 加 BUDGET_HEADROOM 余量），确认后提交。
+
+运行：python -m pytest -q test_golden.py
+"""
+import json
+import math
+import os
+import random
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from bili_dddd import MYOCR_MODEL_PATH
+
+REPO_DIR = Path(__file__).parent
+GOLDEN_DIR = REPO_DIR / "golden"
+CASES_DIR = GOLDEN_DIR / "cases"
+EXPECTED_PATH = GOLDEN_DIR / "expected.json"
+BUDGETS_PATH = GOLDEN_DIR / "budgets.json"
+DEFAULT_TOLERANCE = 20
+MODEL_CLICK_OFFSET = 30  # 与 main.py 中点击时的偏移保持一致
+BUDGET_HEADROOM = 1.2
+UPDATE_GOLDEN = bool(os.environ.get("GOLDEN_UPDATE"))
+
+# 各流程依赖的模型文件（相对仓库根目录，与流程中加载的路径一致），缺失时跳过该流程
+REQUIRED_MODELS = {
+    "model": ["yolov8s.onnx", "siamese.onnx"],
+    "dddd": [MYOCR_MODEL_PATH],
+    "dddd_score": [MYOCR_MODEL_PATH],
+}
+PIPELINE_OPTIONS = {
+    "model": {},
+    "dddd": {"random_fill": False},
+    "dddd_score": {"random_fill": False},
+}
+
+
+def load_cases():
+    cases = []
+    for case_path in sorted(CASES_DIR.glob("*.json")):
+        with open(case_path, "r", encoding="utf-8") as f:
+            case = json.load(f)
+        case["name"] = case_path.stem
+        case["image"] = CASES_DIR / case["image"]
+        case.setdefault("tolerance", DEFAULT_TOLERANCE)
+        cases.append(case)
+    return cases
+
+
+def load_json(path: Path) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_json(path: Path, data: dict) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def click_points(pipeline_name, result):
+    """把各流程的输出统一为 (提示文字, [(x, y), ...])，没有提示文字的流程返回 None"""
+    if pipeline_name == "model":
+        return None, [(x + MODEL_CLICK_OFFSET, y + MODEL_CLICK_OFFSET) for x, y in result]
+    prompt = "".join(char for char, _ in result)
+    points = [None if bbox is None else ((bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2) for _, bbox in result]
+    return prompt, points
+
+
+def check_case(case, prompt, points):
+    """返回该用例的错误列表，空列表表示点击正确"""
+    errors = []
+    if prompt is not None and prompt != case["prompt"]:
+        errors.append(f"提示文字: 期望 '{case['prompt']}'，实际 '{prompt}'")
+    expected = case["clicks"]
+    if len(points) != len(expected):
+        errors.append(f"点击数量: 期望 {len(expected)}，实际 {len(points)}")
+    for i, (want, got) in enumerate(zip(expected, points)):
+        if got is None:
+            errors.append(f"第{i + 1}个点击: 期望 {tuple(want)}，实际未匹配")
+            continue
+        distance = float(np.hypot(want[0] - got[0], want[1] - got[1]))
+        if distance > case["tolerance"]:
+            errors.append(f"第{i + 1}个点击: 期望 {tuple(want)}，实际 ({got[0]:.0f}, {got[1]:.0f})，偏差 {distance:.1f}px")
+    return errors
+
+
+def p95_ms(durations):
+    return float(np.percentile(durations, 95)) * 1000
+
+
+def build_report(case_errors: dict, expected, budget, latencies, stage_durations: dict) -> list[str]:
+    """
+    汇总门禁结果，返回失败说明，空列表表示通过。
+
+    :param case_errors: {用例名: 错误列表}，包含本次运行的全部用例
+    :param expected: expected.json 中该流程的 {用例名: 是否应当通过}，None 表示未标定
+    :param budget: budgets.json 中该流程的预算，None 表示未标定
+    :param latencies: 每张图的耗时（秒）
+    :param stage_durations: {阶段名: [耗时秒, ...]}
+    """
+    report = []
+    if expected is None:
+        report.append("expected.json 中没有该流程的条目，请用 GOLDEN_UPDATE=1 标定")
+        expected = {}
+    else:
+        unknown = [name for name in expected if name not in case_errors]
+        if unknown:
+            report.append(f"expected.json 中的用例不存在: {', '.join(unknown)}")
+        unlisted = [name for name in case_errors if name not in expected]
+        if unlisted:
+            report.append(f"用例未列入 expected.json，请用 GOLDEN_UPDATE=1 标定: {', '.join(unlisted)}")
+
+    regressed = [name for name, should_pass in expected.items() if should_pass and case_errors.get(name)]
+    if regressed:
+        report.append(f"{len(regressed)} 个应当通过的用例失败：")
+        for name in regressed:
+            report.append(f"  {name}:")
+            report.extend(f"    {error}" for error in case_errors[name])
+
+    if budget is None:
+        report.append("budgets.json 中没有该流程的预算，请用 GOLDEN_UPDATE=1 标定")
+    else:
+        stage_budgets = budget.get("stages_p95_ms", {})
+        missing = [stage for stage in stage_budgets if not stage_durations.get(stage)]
+        if missing:
+            report.append(f"预算中的阶段没有耗时记录（阶段改名或预算键拼写错误？）: {', '.join(missing)}")
+        over_budget = p95_ms(latencies) > budget["p95_ms"] or any(
+            p95_ms(stage_durations[stage]) > limit
+            for stage, limit in stage_budgets.items() if stage not in missing
+        )
+        if over_budget:
+            report.append("p95 延迟超出预算")
+
+    if report and latencies:
+        # 任一项回归时都附上分阶段延迟，便于判断是哪个阶段变慢或被牺牲
+        budget = budget or {}
+        stage_budgets = budget.get("stages_p95_ms", {})
+        report.append("p95 延迟（实际 / 预算 ms）：")
+        report.append(f"  整图: {p95_ms(latencies):.1f} / {budget.get('p95_ms', '-')}")
+        for stage, durations in stage_durations.items():
+            report.append(f"  {stage}: {p95_ms(durations):.1f} / {stage_budgets.get(stage, '-')}")
+    return report
+
+
+def calibrate(pipeline_name, case_errors, latencies, stage_durations) -> None:
+    """按本次结果重写该流程的 expected.json 和 budgets.json 条目"""
+    expected = load_json(EXPECTED_PATH)
+    expected[pipeline_name] = {name: not errors for name, errors in case_errors.items()}
+    save_json(EXPECTED_PATH, expected)
+
+    budgets = load_json(BUDGETS_PATH)
+    budgets[pipeline_name] = {
+        "p95_ms": math.ceil(p95_ms(latencies) * BUDGET_HEADROOM),
+        "stages_p95_ms": {stage: math.ceil(p95_ms(durations) * BUDGET_HEADROOM)
+                          for stage, durations in stage_durations.items()},
+    }
+    save_json(BUDGETS_PATH, budgets)
+
+
+CASES = load_cases() if CASES_DIR.is_dir() else []
+
+
+@pytest.mark.skipif(not CASES, reason="golden/cases 下没有黄金集用例")
+@pytest.mark.parametrize("pipeline_name", sorted(REQUIRED_MODELS))
+def test_golden_gate(pipeline_name, tmp_path, monkeypatch):
+    missing = [path for path in REQUIRED_MODELS[pipeline_name] if not (REPO_DIR / path).exists()]
+    if missing:
+        pytest.skip(f"{pipeline_name} 缺少模型文件: {', '.join(missing)}")
+
+    from profiler import SolveProfiler
+    from solve_offline import PIPELINE_CLASSES
+
+    # 模型按相对仓库根目录的路径加载；加载后切到临时目录，中间文件不写入仓库
+    monkeypatch.chdir(REPO_DIR)
+    profiler = SolveProfiler(enabled=False)
+    pipeline = PIPELINE_CLASSES[pipeline_name](profiler, **PIPELINE_OPTIONS[pipeline_name])
+    monkeypatch.chdir(tmp_path)
+
+    # 预热一次，避免首次推理的初始化开销计入延迟
+    random.seed(CASES[0]["name"])
+    pipeline.solve(CASES[0]["image"])
+    profiler.stage_durations.clear()
+
+    latencies, case_errors = [], {}
+    for case in CASES:
+        random.seed(case["name"])
+        start = time.perf_counter()
+        result = pipeline.solve(case["image"])
+        latencies.append(time.perf_counter() - start)
+        case_errors[case["name"]] = check_case(case, *click_points(pipeline_name, result))
+
+    if UPDATE_GOLDEN:
+        calibrate(pipeline_name, case_errors, latencies, profiler.stage_durations)
+        return
+
+    expected = load_json(EXPECTED_PATH).get(pipeline_name)
+    if expected is not None:
+        improved = [name for name, errors in case_errors.items() if not errors and expected.get(name) is False]
+        if improved:
+            print(f"{pipeline_name} 新通过的用例（可用 GOLDEN_UPDATE=1 标定）: {', '.join(improved)}")
+
+    budget = load_json(BUDGETS_PATH).get(pipeline_name)
+    report = build_report(case_errors, expected, budget, latencies, profiler.stage_durations)
+    assert not report, f"{pipeline_name} 黄金集回归:\n" + "\n".join(report)
+
+
+def test_click_points_model_applies_click_offset():
+    prompt, points = click_points("model", [[10, 20], [0, 0]])
+    assert prompt is None
+    assert points == [(40, 50), (30, 30)]
+
+
+def test_click_points_dddd_uses_box_center_and_keeps_misses():
+    prompt, points = click_points("dddd", [("红", (10, 10, 30, 50)), ("烧", None)])
+    assert prompt == "红烧"
+    assert points == [(20, 30), None]
+
+
+def test_check_case():
+    case = {"prompt": "红烧", "clicks": [[20, 30], [100, 100]], "tolerance": 5}
+    assert check_case(case, "红烧", [(22, 33), (100, 104)]) == []
+    assert check_case(case, None, [(20, 30), (100, 100)]) == []
+
+    errors = check_case(case, "红茄", [(20, 30), None])
+    assert len(errors) == 2
+    assert "提示文字" in errors[0] and "未匹配" in errors[1]
+
+    errors = check_case(case, "红烧", [(20, 30), (110, 100)])
+    assert len(errors) == 1 and "偏差 10.0px" in errors[0]
+
+    assert "点击数量" in check_case(case, "红烧", [(20, 30)])[0]
+
+
+def test_p95_ms():
+    assert p95_ms([0.1] * 19 + [1.0]) == pytest.approx(145.0)
+
+
+BUDGET = {"p95_ms": 100, "stages_p95_ms": {"dddd.detect": 50}}
+
+
+def test_build_report_passes_within_expectations():
+    case_errors = {"a": [], "b": ["第1个点击: 偏差"]}
+    report = build_report(case_errors, {"a": True, "b": False}, BUDGET, [0.05, 0.06], {"dddd.detect": [0.01, 0.02]})
+    assert report == []
+
+
+def test_build_report_flags_each_regressed_case():
+    case_errors = {"a": [], "b": ["第1个点击: 实际未匹配"], "c": ["提示文字: 不符"]}
+    expected = {"a": True, "b": True, "c": True}
+    report = build_report(case_errors, expected, BUDGET, [0.05], {"dddd.detect": [0.01]})
+    text = "\n".join(report)
+    assert "2 个应当通过的用例失败" in text
+    assert "  b:" in text and "实际未匹配" in text and "  c:" in text
+    # 失败时附带分阶段延迟
+    assert "dddd.detect: 10.0 / 50" in text
+
+
+def test_build_report_flags_unknown_and_unlisted_cases():
+    report = build_report({"a": [], "new": []}, {"a": True, "typo": True}, BUDGET, [0.05], {"dddd.detect": [0.01]})
+    assert "expected.json 中的用例不存在: typo" in report
+    assert "用例未列入 expected.json，请用 GOLDEN_UPDATE=1 标定: new" in report
+
+
+def test_build_report_fails_without_calibration():
+    # 有用例但流程没有 expected.json 条目或预算时不能静默通过
+    report = build_report({"a": []}, None, None, [0.05], {})
+    assert "expected.json 中没有该流程的条目，请用 GOLDEN_UPDATE=1 标定" in report
+    assert "budgets.json 中没有该流程的预算，请用 GOLDEN_UPDATE=1 标定" in report
+
+
+def test_build_report_flags_latency_over_budget():
+    budget = {"p95_ms": 100, "stages_p95_ms": {"dddd.detect": 5}}
+    report = build_report({"a": []}, {"a": True}, budget, [0.05], {"dddd.detect": [0.01]})
+    assert "p95 延迟超出预算" in report
+    assert "  dddd.detect: 10.0 / 5" in report
+
+    report = build_report({"a": []}, {"a": True}, {"p95_ms": 10}, [0.05], {})
+    assert "p95 延迟超出预算" in report
+    assert "  整图: 50.0 / 10" in report
+
+
+def test_build_report_flags_budgeted_stage_without_samples():
+    budget = {"p95_ms": 100, "stages_p95_ms": {"dddd.fill_click_sequnce_scored": 50}}
+    stage_durations = {"dddd.fill_click_sequence_scored": [0.01]}
+    report = build_report({"a": []}, {"a": True}, budget, [0.05], stage_durations)
+    assert "dddd.fill_click_sequnce_scored" in report[0]
+    # 不会向阶段耗时中插入空记录
+    assert list(stage_durations) == ["dddd.fill_click_sequence_scored"]